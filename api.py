@@ -1,17 +1,26 @@
 """
 API для Mini App
-Предоставляет список доступных подарков
+Предоставляет список доступных подарков, рейтинг победителей и историю выигрышей
 """
 
 import os
 import json
+import hmac
+import time
+import asyncio
+import hashlib
 import logging
+from urllib.parse import parse_qsl
+from dotenv import load_dotenv
 from aiohttp import web
+from sortedcontainers import SortedList
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.log import setup_logging
 # Note: Keeping your database imports as they were
 try:
-    from database.models import get_session, Gift
+    from sqlalchemy import func
+    from database.models import get_session, Gift, User, Win
 except ImportError:
     # Fallback for demonstration if database module is not found in current environment
     logger = logging.getLogger(__name__)
@@ -19,13 +28,110 @@ except ImportError:
     class Gift:
         pass
 
+# Load environment variables
+load_dotenv()
+
 # Configure logging
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
+setup_logging()
 logger = logging.getLogger(__name__)
 
+BOT_TOKEN = os.getenv('BOT_TOKEN')
+INIT_DATA_MAX_AGE = int(os.getenv('INIT_DATA_MAX_AGE', '86400'))  # секунд
+LEADERBOARD_REFRESH_INTERVAL = float(os.getenv('LEADERBOARD_REFRESH_INTERVAL', '5'))  # секунд
+LEADERBOARD_MAX_LIMIT = 100
+USER_WINS_LIMIT = 50
+
+
+class Leaderboard:
+    """
+    Рейтинг победителей в памяти.
+
+    Ключи (-wins, last_win_id, telegram_id) лежат в SortedList, поэтому
+    обновление, топ-N и место пользователя - O(log n). При равном числе
+    выигрышей выше тот, кто набрал его раньше.
+    """
+
+    def __init__(self):
+        self._ranking = SortedList()
+        self._keys = {}   # telegram_id -> ключ в _ranking
+        self._names = {}  # telegram_id -> (username, first_name)
+        self.last_win_id = 0
+
+    def __len__(self):
+        return len(self._ranking)
+
+    def _set(self, telegram_id, wins, last_win_id):
+        old_key = self._keys.get(telegram_id)
+        if old_key is not None:
+            self._ranking.remove(old_key)
+        key = (-wins, last_win_id, telegram_id)
+        self._ranking.add(key)
+        self._keys[telegram_id] = key
+
+    def add_win(self, telegram_id, win_id, username=None, first_name=None):
+        """Учесть один новый выигрыш"""
+        old_key = self._keys.get(telegram_id)
+        wins = -old_key[0] + 1 if old_key else 1
+        self._set(telegram_id, wins, win_id)
+        self._names[telegram_id] = (username, first_name)
+        self.last_win_id = max(self.last_win_id, win_id)
+
+    def top(self, limit):
+        """Первые limit мест"""
+        result = []
+        for rank, (neg_wins, _, telegram_id) in enumerate(self._ranking.islice(0, limit), start=1):
+            username, first_name = self._names.get(telegram_id, (None, None))
+            result.append({
+                'rank': rank,
+                'username': username,
+                'first_name': first_name,
+                'wins': -neg_wins
+            })
+        return result
+
+    def rank_of(self, telegram_id):
+        """Место и число выигрышей пользователя, (None, 0) если выигрышей нет"""
+        key = self._keys.get(telegram_id)
+        if key is None:
+            return None, 0
+        return self._ranking.index(key) + 1, -key[0]
+
+    def rebuild(self, session):
+        """Собрать рейтинг заново из таблицы wins (при старте)"""
+        rows = session.query(
+            Win.telegram_user_id,
+            func.count(Win.id),
+            func.max(Win.id),
+            User.username,
+            User.first_name
+        ).join(User, Win.user_id == User.id).group_by(
+            Win.telegram_user_id, User.username, User.first_name
+        ).all()
+        
+        self._ranking.clear()
+        self._keys.clear()
+        self._names.clear()
+        self.last_win_id = 0
+        for telegram_id, wins, last_win_id, username, first_name in rows:
+            self._set(telegram_id, wins, last_win_id)
+            self._names[telegram_id] = (username, first_name)
+            self.last_win_id = max(self.last_win_id, last_win_id)
+
+    def refresh(self, session):
+        """Добавить выигрыши, появившиеся после last_win_id. Возвращает их число"""
+        rows = session.query(
+            Win.id, Win.telegram_user_id, User.username, User.first_name
+        ).join(User, Win.user_id == User.id).filter(
+            Win.id > self.last_win_id
+        ).order_by(Win.id).all()
+        
+        for win_id, telegram_id, username, first_name in rows:
+            self.add_win(telegram_id, win_id, username, first_name)
+        return len(rows)
+
+
+leaderboard = Leaderboard()
+
 
 async def get_gifts(request):
     """GET /api/gifts - получить список доступных подарков"""
@@ -54,7 +160,10 @@ async def get_gifts(request):
                 {"id": 4, "emoji": "🎀", "name": "Common Gift", "rarity": "common", "quantity": 10}
             ]
         
-        logger.info(f"Returned {len(gifts_data)} available gifts")
+        logger.info(
+            "Returned %s available gifts", len(gifts_data),
+            extra={'event': 'gifts_listed', 'count': len(gifts_data)}
+        )
         
         return web.json_response({
             'success': True,
@@ -62,13 +171,102 @@ async def get_gifts(request):
         })
         
     except Exception as e:
-        logger.error(f"Error getting gifts: {e}", exc_info=True)
+        logger.error("Error getting gifts: %s", e, exc_info=True)
         return web.json_response({
             'success': False,
             'error': str(e)
         }, status=500)
 
 
+async def get_leaderboard(request):
+    """GET /api/leaderboard?limit=N - топ победителей"""
+    try:
+        limit = int(request.query.get('limit', 10))
+    except ValueError:
+        return web.json_response({'success': False, 'error': 'limit must be an integer'}, status=400)
+    limit = max(1, min(limit, LEADERBOARD_MAX_LIMIT))
+    
+    return web.json_response({
+        'success': True,
+        'total_winners': len(leaderboard),
+        'leaderboard': leaderboard.top(limit)
+    })
+
+
+def verify_init_data(init_data):
+    """
+    Проверить подпись Telegram.WebApp.initData и вернуть Telegram ID пользователя.
+
+    Ключ: HMAC-SHA256("WebAppData", BOT_TOKEN), подпись считается по
+    отсортированным парам key=value без hash. None, если проверка не прошла.
+    """
+    if not BOT_TOKEN or not init_data:
+        return None
+    
+    try:
+        # Пустые поля тоже входят в подпись Telegram
+        fields = dict(parse_qsl(init_data, keep_blank_values=True, strict_parsing=True))
+    except ValueError:
+        return None
+    received_hash = fields.pop('hash', '')
+    
+    data_check_string = '\n'.join(f"{key}={value}" for key, value in sorted(fields.items()))
+    secret_key = hmac.new(b'WebAppData', BOT_TOKEN.encode(), hashlib.sha256).digest()
+    expected_hash = hmac.new(secret_key, data_check_string.encode(), hashlib.sha256).hexdigest()
+    if not hmac.compare_digest(expected_hash, received_hash):
+        return None
+    
+    try:
+        if time.time() - int(fields['auth_date']) > INIT_DATA_MAX_AGE:
+            return None
+        return int(json.loads(fields['user'])['id'])
+    except (KeyError, ValueError, TypeError):
+        return None
+
+
+async def get_my_wins(request):
+    """
+    GET /api/me/wins - выигрыши пользователя и его место
+
+    Mini App передаёт Telegram.WebApp.initData в заголовке
+    "Authorization: tma <initData>", пользователь берётся из проверенного поля user.
+    """
+    auth_type, _, init_data = request.headers.get('Authorization', '').partition(' ')
+    telegram_id = verify_init_data(init_data) if auth_type == 'tma' else None
+    if telegram_id is None:
+        return web.json_response({'success': False, 'error': 'invalid init data'}, status=401)
+    
+    # Рейтинг может отставать на LEADERBOARD_REFRESH_INTERVAL, поэтому
+    # история и число выигрышей всегда берутся из БД
+    rank, total_wins = leaderboard.rank_of(telegram_id)
+    wins_data = []
+    
+    if 'get_session' in globals():
+        session = get_session()
+        user_wins = session.query(Win).filter(Win.telegram_user_id == telegram_id)
+        total_wins = user_wins.count()
+        wins = user_wins.join(Gift).order_by(Win.id.desc()).limit(USER_WINS_LIMIT).all()
+        wins_data = [
+            {
+                'id': win.id,
+                'emoji': win.gift.emoji,
+                'name': win.gift.name,
+                'rarity': win.gift.rarity,
+                'status': win.status,
+                'won_at': win.won_at.isoformat() if win.won_at else None
+            }
+            for win in wins
+        ]
+        session.close()
+    
+    return web.json_response({
+        'success': True,
+        'rank': rank,
+        'total_wins': total_wins,
+        'wins': wins_data
+    })
+
+
 async def health_check(request):
     """GET / - проверка работоспособности API"""
     return web.json_response({
@@ -101,7 +299,7 @@ async def cors_middleware(request, handler):
     except web.HTTPException as ex:
         response = ex
     except Exception as e:
-        logger.error(f"Unhandled exception: {e}", exc_info=True)
+        logger.error("Unhandled exception: %s", e, exc_info=True)
         response = web.json_response({'success': False, 'error': str(e)}, status=500)
     
     # Add CORS headers to response
@@ -112,13 +310,54 @@ async def cors_middleware(request, handler):
     return response
 
 
+async def leaderboard_ctx(app):
+    """Собрать рейтинг при старте и подтягивать новые выигрыши из БД"""
+    if 'get_session' not in globals():
+        yield
+        return
+    
+    # Недоступная БД не должна мешать старту API: poll() начнёт с
+    # last_win_id = 0 и соберёт рейтинг по мере появления соединения
+    session = get_session()
+    try:
+        leaderboard.rebuild(session)
+        logger.info(
+            "Leaderboard built: %s winners, last win id %s", len(leaderboard), leaderboard.last_win_id,
+            extra={'event': 'leaderboard_rebuilt', 'winners': len(leaderboard)}
+        )
+    except Exception as e:
+        logger.error("Error building leaderboard: %s", e, exc_info=True)
+    finally:
+        session.close()
+    
+    # Выигрыши пишет бот в другом процессе, поэтому новые строки
+    # забираются по id > last_win_id и применяются инкрементально
+    async def poll():
+        while True:
+            await asyncio.sleep(LEADERBOARD_REFRESH_INTERVAL)
+            session = get_session()
+            try:
+                leaderboard.refresh(session)
+            except Exception as e:
+                logger.error("Error refreshing leaderboard: %s", e, exc_info=True)
+            finally:
+                session.close()
+    
+    task = asyncio.create_task(poll())
+    yield
+    task.cancel()
+
+
 def create_app():
     """Создать web приложение"""
     app = web.Application(middlewares=[cors_middleware])
+    app.cleanup_ctx.append(leaderboard_ctx)
     
     # Роуты
     app.router.add_get('/', health_check)
     app.router.add_get('/api/gifts', get_gifts)
+    app.router.add_get('/api/leaderboard', get_leaderboard)
+    app.router.add_get('/api/me/wins', get_my_wins)
     # Options handler is now handled by middleware for all routes
     
     return app
@@ -21,15 +21,13 @@ from database.models import (
     get_session, User, Gift, Win, 
     init_db, add_initial_gifts
 )
+from utils.log import setup_logging
 
 # Load environment variables
 load_dotenv()
 
 # Configure logging
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
+setup_logging()
 logger = logging.getLogger(__name__)
 
 # Bot configuration
@@ -54,7 +52,10 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         session.add(db_user)
         session.commit()
-        logger.info(f"New user registered: {user.id} (@{user.username})")
+        logger.info(
+            "New user registered: %s (@%s)", user.id, user.username,
+            extra={'event': 'user_registered', 'user_id': user.id}
+        )
     session.close()
     
     # Проверяем, пришёл ли пользователь после джекпота
@@ -90,10 +91,13 @@ async def handle_dice(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if message.dice and message.dice.emoji == "🎰":
         dice_value = message.dice.value
         
-        logger.info(f"User {user.id} (@{user.username}) rolled: {dice_value}")
-        
         # Проверяем на джекпот (значение 64 = 777)
         if dice_value == 64:
+            logger.info(
+                "User %s (@%s) hit the jackpot", user.id, user.username,
+                extra={'event': 'jackpot', 'user_id': user.id, 'value': dice_value}
+            )
+            
             # ДЖЕКПОТ! 🎉
             keyboard = [
                 [InlineKeyboardButton("🎁 Забрать приз", url=f"https://t.me/{context.bot.username}?start=jackpot")]
@@ -108,7 +112,12 @@ async def handle_dice(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 reply_markup=reply_markup
             )
         else:
-            # Не джекпот
+            # Не джекпот - частое событие, сэмплируется
+            logger.info(
+                "User %s rolled: %s", user.id, dice_value,
+                extra={'event': 'dice_roll', 'user_id': user.id, 'value': dice_value}
+            )
+            
             await message.reply_text(
                 f"😔 Не повезло... Выпало: {dice_value}\n"
                 f"Попробуй ещё раз! Нужно выбить 777! 🎰"
@@ -120,7 +129,10 @@ async def handle_web_app_data(update: Update, context: ContextTypes.DEFAULT_TYPE
     data = update.message.web_app_data.data
     user = update.effective_user
     
-    logger.info(f"Received data from Mini App: {data}")
+    logger.info(
+        "Received data from Mini App: %s", data,
+        extra={'event': 'web_app_data', 'user_id': user.id}
+    )
     
     try:
         # Парсим данные из Mini App
@@ -170,7 +182,10 @@ async def handle_web_app_data(update: Update, context: ContextTypes.DEFAULT_TYPE
         
         session.commit()
         
-        logger.info(f"Prize saved: {gift.name} for user {user.id}. Remaining: {gift.quantity}")
+        logger.info(
+            "Prize saved: %s for user %s. Remaining: %s", gift.name, user.id, gift.quantity,
+            extra={'event': 'prize_claimed', 'user_id': user.id, 'gift_id': gift.id, 'remaining': gift.quantity}
+        )
         
         # Отправляем сообщение победителю
         keyboard = [
@@ -191,7 +206,7 @@ async def handle_web_app_data(update: Update, context: ContextTypes.DEFAULT_TYPE
         session.close()
         
     except Exception as e:
-        logger.error(f"Error processing web app data: {e}", exc_info=True)
+        logger.error("Error processing web app data: %s", e, exc_info=True)
         await update.message.reply_text(
             "❌ Произошла ошибка при обработке выигрыша. Попробуйте позже."
         )
@@ -246,7 +261,7 @@ async def add_gift_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         session.close()
         
     except Exception as e:
-        logger.error(f"Error adding gift: {e}", exc_info=True)
+        logger.error("Error adding gift: %s", e, exc_info=True)
         await update.message.reply_text(f"❌ Ошибка: {e}")
 
 
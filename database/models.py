@@ -54,7 +54,7 @@ class Win(Base):
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
     gift_id = Column(Integer, ForeignKey('gifts.id'), nullable=False)
-    telegram_user_id = Column(Integer, nullable=False)  # Telegram ID для быстрого поиска
+    telegram_user_id = Column(Integer, nullable=False, index=True)  # Telegram ID для быстрого поиска
     status = Column(String(50), default='pending')  # pending, sent, claimed
     won_at = Column(DateTime, default=datetime.utcnow)
     sent_at = Column(DateTime, nullable=True)
@@ -126,6 +126,9 @@ def init_db():
     """Инициализация базы данных"""
     eng = get_engine()
     Base.metadata.create_all(eng)
+    # create_all не добавляет индексы в уже существующие таблицы
+    for index in Win.__table__.indexes:
+        index.create(eng, checkfirst=True)
     print("✅ Database initialized successfully!")
 
 
@@ -0,0 +1,266 @@
+"""
+Monte Carlo simulator for the gift pool
+Models jackpot arrivals and the Mini App roulette to tune rarity weights and quantities
+
+Запуск:
+    python simulator/main.py --campaigns 1000000
+    python simulator/main.py --weight legendary=1,2 --weight epic=3,5
+"""
+
+import os
+import sys
+import time
+import argparse
+import itertools
+from dataclasses import dataclass
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Веса редкостей из getWeightedRandomGift() в docs/index.html
+RARITY_WEIGHTS = {
+    'legendary': 1,
+    'epic': 3,
+    'rare': 10,
+    'common': 30,
+}
+DEFAULT_WEIGHT = 10
+
+# Слот-машина 🎰 возвращает значения 1..64, джекпот 777 = 64
+JACKPOT_PROBABILITY = 1 / 64
+
+Z_95 = 1.959964
+
+
+@dataclass
+class SimulationResult:
+    """Результаты прогона для одного набора весов"""
+    weights: dict
+    campaigns: int
+    depletion_hours: dict      # rarity -> массив времени исчерпания (NaN если не исчерпан)
+    pool_depletion_hours: np.ndarray
+    rejections: np.ndarray     # "подарок закончился" на кампанию
+    elapsed: float
+
+
+def load_pool():
+    """Прочитать все подарки из таблицы Gift, включая закончившиеся"""
+    from database.models import get_session, Gift
+
+    session = get_session()
+    gifts = session.query(Gift).order_by(Gift.id).all()
+    pool = [(gift.rarity, gift.quantity or 0) for gift in gifts]
+    session.close()
+    return pool
+
+
+def simulate(pool, weights=None, campaigns=100_000, spins_per_hour=60.0,
+             jackpot_probability=JACKPOT_PROBABILITY, claim_delay_minutes=1.0,
+             max_lag=8, batch_size=100_000, seed=None):
+    """
+    Прогнать campaigns независимых кампаний до полного исчерпания пула.
+
+    Кампании идут батчами, внутри батча все розыгрыши векторизованы.
+    Каждый шаг - один джекпот: время до него экспоненциальное с
+    интенсивностью spins_per_hour * jackpot_probability. Mini App берёт
+    список подарков на момент открытия, поэтому за claim_delay_minutes
+    другие победители успевают забрать подарки (их число ~ Пуассон,
+    не больше max_lag). Если выбранный по устаревшему списку подарок уже
+    закончился - это отказ "Этот подарок закончился!".
+    """
+    weights = weights or RARITY_WEIGHTS
+    rng = np.random.default_rng(seed)
+
+    rarities = [rarity for rarity, _ in pool]
+    initial = np.array([quantity for _, quantity in pool], dtype=np.int32)
+    # getWeightedRandomGift() кладёт ceil(weight) копий подарка в массив
+    gift_weights = np.ceil(np.array([weights.get(r, DEFAULT_WEIGHT) for r in rarities], dtype=np.float64))
+    n_gifts = len(pool)
+
+    jackpot_rate = spins_per_hour * jackpot_probability
+    if n_gifts == 0 or jackpot_rate <= 0:
+        raise ValueError("Pool is empty or jackpot rate is zero")
+    if (gift_weights[initial > 0] <= 0).any():
+        # Подарок с нулевым весом никогда не выпадет, и кампания не закончится
+        raise ValueError("Every gift in the pool needs a positive weight")
+
+    mean_lag = jackpot_rate * claim_delay_minutes / 60
+
+    depletion = np.full((campaigns, n_gifts), np.nan)
+    rejections = np.zeros(campaigns, dtype=np.int32)
+
+    started = time.perf_counter()
+    for lo in range(0, campaigns, batch_size):
+        hi = min(lo + batch_size, campaigns)
+        n = hi - lo
+        rows = np.arange(n)
+
+        stock = np.broadcast_to(initial, (n, n_gifts)).copy()
+        now = np.zeros(n)
+        # Кольцевой буфер снимков пула для устаревших списков Mini App
+        history = np.empty((max_lag + 1, n, n_gifts), dtype=np.int32)
+        history[0] = stock
+        batch_depletion = depletion[lo:hi]
+
+        # Число отказов не ограничено размером пула, поэтому крутим до
+        # исчерпания: снимок всегда содержит оставшиеся подарки, и у каждой
+        # активной кампании есть ненулевой шанс уменьшить пул
+        step = 0
+        while True:
+            active = stock.any(axis=1)
+            if not active.any():
+                break
+
+            now += rng.exponential(1 / jackpot_rate, size=n)
+
+            lag = np.minimum(rng.poisson(mean_lag, size=n), max_lag)
+            seen_step = np.maximum(step - lag, 0)
+            snapshot = history[seen_step % (max_lag + 1), rows]
+
+            cumulative = np.cumsum((snapshot > 0) * gift_weights, axis=1)
+            total = cumulative[:, -1]
+            drawn = rng.random(n) * total
+            choice = np.minimum((cumulative <= drawn[:, None]).sum(axis=1), n_gifts - 1)
+
+            claiming = active & (total > 0)
+            in_stock = stock[rows, choice] > 0
+            granted = claiming & in_stock
+
+            rejections[lo:hi] += claiming & ~in_stock
+            stock[rows[granted], choice[granted]] -= 1
+
+            emptied = granted & (stock[rows, choice] == 0)
+            batch_depletion[rows[emptied], choice[emptied]] = now[emptied]
+
+            history[(step + 1) % (max_lag + 1)] = stock
+            step += 1
+
+    elapsed = time.perf_counter() - started
+
+    depletion_hours = {}
+    for rarity in dict.fromkeys(rarities):
+        columns = [i for i, r in enumerate(rarities) if r == rarity]
+        # Редкость распродана, когда закончился последний её подарок
+        depletion_hours[rarity] = depletion[:, columns].max(axis=1)
+
+    return SimulationResult(
+        weights=dict(weights),
+        campaigns=campaigns,
+        depletion_hours=depletion_hours,
+        pool_depletion_hours=depletion.max(axis=1),
+        rejections=rejections,
+        elapsed=elapsed,
+    )
+
+
+def confidence_interval(values):
+    """Среднее и 95% доверительный интервал"""
+    values = values[~np.isnan(values)]
+    if values.size == 0:
+        return float('nan'), float('nan'), float('nan')
+    mean = values.mean()
+    half = Z_95 * values.std(ddof=1) / np.sqrt(values.size) if values.size > 1 else 0.0
+    return mean, mean - half, mean + half
+
+
+def format_result(result):
+    """Текстовый отчёт по одному прогону"""
+    weights = ', '.join(f"{r}={w:g}" for r, w in result.weights.items())
+    lines = [f"⚖️ Weights: {weights}  ({result.campaigns} campaigns, {result.elapsed:.2f}s)"]
+
+    lines.append(f"  {'rarity':<12}{'mean h':>10}{'95% CI':>22}{'p50':>9}{'p90':>9}")
+    series = list(result.depletion_hours.items()) + [('ALL', result.pool_depletion_hours)]
+    for rarity, hours in series:
+        mean, low, high = confidence_interval(hours)
+        p50, p90 = np.nanpercentile(hours, [50, 90])
+        lines.append(
+            f"  {rarity:<12}{mean:>10.2f}{f'[{low:.2f}, {high:.2f}]':>22}{p50:>9.2f}{p90:>9.2f}"
+        )
+
+    mean, low, high = confidence_interval(result.rejections.astype(np.float64))
+    lines.append(f"  ❌ Sold out rejections: {mean:.3f} [{low:.3f}, {high:.3f}] per campaign")
+    return '\n'.join(lines)
+
+
+def parse_weight_grid(specs):
+    """Разобрать --weight rarity=v1,v2 в список словарей весов (декартово произведение)"""
+    grid = {}
+    for spec in specs:
+        rarity, _, values = spec.partition('=')
+        if not values:
+            raise ValueError(f"Bad --weight value: {spec}")
+        try:
+            # Mini App понимает только целые веса (по копии на шаг цикла)
+            grid[rarity] = [int(v) for v in values.split(',')]
+        except ValueError:
+            raise ValueError(f"Bad --weight value: {spec}") from None
+
+    names = list(grid)
+    combos = []
+    for values in itertools.product(*(grid[name] for name in names)):
+        weights = dict(RARITY_WEIGHTS)
+        weights.update(zip(names, values))
+        combos.append(weights)
+    return combos
+
+
+def main():
+    """Запуск симуляции"""
+    parser = argparse.ArgumentParser(description="Gift pool depletion simulator")
+    parser.add_argument('--campaigns', type=int, default=100_000)
+    parser.add_argument('--spins-per-hour', type=float, default=60.0)
+    parser.add_argument('--jackpot-probability', type=float, default=JACKPOT_PROBABILITY)
+    parser.add_argument('--claim-delay', type=float, default=1.0,
+                        help="minutes between opening the Mini App and claiming")
+    parser.add_argument('--max-lag', type=int, default=8)
+    parser.add_argument('--batch-size', type=int, default=100_000)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--weight', action='append', default=[],
+                        help="rarity=v1,v2,... (repeat to sweep a grid)")
+    parser.add_argument('--quantity', action='append', default=[],
+                        help="rarity=N to override quantities read from the database")
+    args = parser.parse_args()
+
+    try:
+        weight_grid = parse_weight_grid(args.weight)
+    except ValueError as e:
+        parser.error(str(e))
+
+    overrides = {}
+    for spec in args.quantity:
+        rarity, _, quantity = spec.partition('=')
+        try:
+            overrides[rarity] = int(quantity)
+        except ValueError:
+            parser.error(f"Bad --quantity value: {spec}")
+
+    # Переопределения применяются до фильтра, чтобы распроданные
+    # в БД редкости можно было вернуть в пул
+    pool = [(r, overrides.get(r, q)) for r, q in load_pool()]
+    pool = [(r, q) for r, q in pool if q > 0]
+
+    if not pool:
+        print("⚠️ No gifts with quantity > 0 in database")
+        return
+
+    print("🎁 Pool: " + ', '.join(f"{r} x{q}" for r, q in pool))
+    for weights in weight_grid:
+        if any(weights.get(r, DEFAULT_WEIGHT) <= 0 for r, _ in pool):
+            parser.error("Weights must be positive for every rarity in the pool")
+        result = simulate(
+            pool,
+            weights=weights,
+            campaigns=args.campaigns,
+            spins_per_hour=args.spins_per_hour,
+            jackpot_probability=args.jackpot_probability,
+            claim_delay_minutes=args.claim_delay,
+            max_lag=args.max_lag,
+            batch_size=args.batch_size,
+            seed=args.seed,
+        )
+        print(format_result(result))
+
+
+if __name__ == '__main__':
+    main()
@@ -4,22 +4,24 @@ Listens for stickers and sends gifts to winners from database
 """
 
 import os
+import json
+import asyncio
 import logging
+from collections import OrderedDict, namedtuple
 from datetime import datetime
 from dotenv import load_dotenv
 from telethon import TelegramClient, events
+from telethon.errors import FloodWaitError, RPCError
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from database.models import get_session, Win, Gift
+from utils.log import setup_logging
 
 # Load environment variables
 load_dotenv()
 
 # Configure logging
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
+setup_logging()
 logger = logging.getLogger(__name__)
 
 # Userbot credentials
@@ -27,20 +29,144 @@ API_ID = int(os.getenv('USERBOT_API_ID'))
 API_HASH = os.getenv('USERBOT_API_HASH')
 PHONE = os.getenv('USERBOT_PHONE')
 
+# Entity cache
+ENTITY_CACHE_PATH = os.getenv('ENTITY_CACHE_PATH', 'entity_cache.json')
+ENTITY_CACHE_SIZE = int(os.getenv('ENTITY_CACHE_SIZE', '10000'))
+ENTITY_CACHE_SAVE_INTERVAL = 60  # секунд
+PRELOAD_CHUNK_SIZE = 100  # пользователей в одном GetUsers
+
 # Create client
 client = TelegramClient('gift_sender', API_ID, API_HASH)
 
 
+CachedSender = namedtuple('CachedSender', ['id', 'username', 'first_name'])
+
+
+class EntityCache:
+    """LRU-кэш отправителей с сохранением на диск"""
+
+    def __init__(self, path, max_size):
+        self.path = path
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._dirty = False
+        self.hits = 0
+        self.misses = 0
+        self.from_event = 0
+
+    def __contains__(self, user_id):
+        return user_id in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, user_id):
+        """Найти отправителя по Telegram ID, None если его нет в кэше"""
+        entry = self._entries.get(user_id)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(user_id)
+        self.hits += 1
+        return entry
+
+    def put(self, entity):
+        """Сохранить Telethon User (или CachedSender) в кэш"""
+        entry = CachedSender(
+            id=entity.id,
+            username=getattr(entity, 'username', None),
+            first_name=getattr(entity, 'first_name', None)
+        )
+        if self._entries.get(entry.id) != entry:
+            self._dirty = True
+        self._entries[entry.id] = entry
+        self._entries.move_to_end(entry.id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        return entry
+
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def load(self):
+        """Загрузить кэш с диска (старые записи первыми)"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                rows = json.load(f)
+            entries = [
+                CachedSender(id=row['id'], username=row.get('username'), first_name=row.get('first_name'))
+                for row in rows[-self.max_size:]
+            ]
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError, TypeError, KeyError, AttributeError) as e:
+            logger.warning("Could not load entity cache %s: %s", self.path, e)
+            return
+        for entry in entries:
+            self.put(entry)
+        self._dirty = False
+        logger.info("Loaded %s cached entities from %s", len(self), self.path)
+
+    def save(self):
+        """Записать кэш на диск, если он изменился"""
+        if not self._dirty:
+            return
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump([entry._asdict() for entry in self._entries.values()], f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+        self._dirty = False
+
+    def report(self):
+        logger.info(
+            "Entity cache: %s entries, hit rate %.1f%% (%s hits, %s misses, %s from event)",
+            len(self), self.hit_rate() * 100, self.hits, self.misses, self.from_event,
+            extra={
+                'event': 'entity_cache_stats',
+                'size': len(self),
+                'hits': self.hits,
+                'misses': self.misses,
+                'from_event': self.from_event,
+            }
+        )
+
+
+entity_cache = EntityCache(ENTITY_CACHE_PATH, ENTITY_CACHE_SIZE)
+
+
+async def resolve_sender(event):
+    """Отправитель без сетевого запроса, если он есть в апдейте или в кэше"""
+    # Telethon заполняет event.sender из сущностей самого апдейта
+    if event.sender is not None:
+        entity_cache.from_event += 1
+        return entity_cache.put(event.sender)
+    
+    cached = entity_cache.get(event.sender_id)
+    if cached is not None:
+        return cached
+    
+    sender = await event.get_sender()
+    if sender is None:
+        return None
+    return entity_cache.put(sender)
+
+
 @client.on(events.NewMessage(incoming=True, func=lambda e: e.is_private))
 async def handle_incoming_message(event):
     """Обработчик входящих личных сообщений"""
-    sender = await event.get_sender()
+    sender = await resolve_sender(event)
+    if sender is None:
+        return
     
-    logger.info(f"Received message from {sender.id} (@{sender.username})")
+    logger.info(
+        "Received message from %s (@%s)", sender.id, sender.username,
+        extra={'event': 'message_received', 'user_id': sender.id}
+    )
     
     # Если пользователь отправил стикер
     if event.message.sticker:
-        logger.info(f"User {sender.id} sent sticker. Checking database...")
+        logger.debug("User %s sent sticker. Checking database...", sender.id)
         
         # Проверяем БД - есть ли у этого пользователя pending приз
         session = get_session()
@@ -54,7 +180,10 @@ async def handle_incoming_message(event):
             # Есть приз!
             gift = pending_win.gift
             
-            logger.info(f"Found pending gift for user {sender.id}: {gift.name}")
+            logger.info(
+                "Found pending gift for user %s: %s", sender.id, gift.name,
+                extra={'event': 'pending_gift_found', 'user_id': sender.id, 'win_id': pending_win.id}
+            )
             
             # Отправляем эмодзи подарка (пока без реального)
             await event.reply(
@@ -70,11 +199,17 @@ async def handle_incoming_message(event):
             pending_win.sent_at = datetime.utcnow()
             session.commit()
             
-            logger.info(f"Gift {gift.name} sent to user {sender.id}")
+            logger.info(
+                "Gift %s sent to user %s", gift.name, sender.id,
+                extra={'event': 'gift_sent', 'user_id': sender.id, 'win_id': pending_win.id}
+            )
             
         else:
             # Нет приза
-            logger.info(f"No pending gift for user {sender.id}")
+            logger.info(
+                "No pending gift for user %s", sender.id,
+                extra={'event': 'no_pending_gift', 'user_id': sender.id}
+            )
             
             await event.reply(
                 "🤔 Похоже, у вас пока нет выигрышей!\n\n"
@@ -88,21 +223,92 @@ async def handle_incoming_message(event):
         session.close()
 
 
+async def preload_pending_winners():
+    """Прогреть кэш пользователями, у которых есть pending выигрыши"""
+    session = get_session()
+    user_ids = [
+        row[0] for row in
+        session.query(Win.telegram_user_id).filter(Win.status == 'pending').distinct()
+    ]
+    session.close()
+    
+    # access_hash берётся только из session-файла Telethon, без сети;
+    # неизвестных пользователей пропускаем, они попадут в кэш при первом
+    # сообщении. В сеть идёт только пакетный get_entity ниже
+    missing = [user_id for user_id in user_ids if user_id not in entity_cache]
+    peers = []
+    for user_id in missing:
+        try:
+            peers.append(client.session.get_input_entity(user_id))
+        except ValueError as e:
+            logger.debug("Could not resolve pending winner %s: %s", user_id, e)
+    
+    loaded = 0
+    for start in range(0, len(peers), PRELOAD_CHUNK_SIZE):
+        chunk = peers[start:start + PRELOAD_CHUNK_SIZE]
+        try:
+            for entity in await client.get_entity(chunk):
+                entity_cache.put(entity)
+                loaded += 1
+        except FloodWaitError as e:
+            logger.warning("Flood wait of %s s while preloading entity cache, stopping", e.seconds)
+            break
+        except (RPCError, ValueError) as e:
+            logger.warning("Could not preload %s pending winners: %s", len(chunk), e)
+    
+    logger.info(
+        "Preloaded %s of %s pending winners into entity cache", loaded, len(missing),
+        extra={'event': 'entity_cache_preload', 'pending_users': len(user_ids), 'loaded': loaded}
+    )
+
+
+def save_entity_cache():
+    """Сохранить кэш и залогировать hit rate, не роняя userbot при ошибке диска"""
+    try:
+        entity_cache.save()
+    except OSError as e:
+        logger.error("Could not save entity cache %s: %s", entity_cache.path, e)
+    entity_cache.report()
+
+
+async def persist_entity_cache():
+    """Периодически сохранять кэш на диск и логировать hit rate"""
+    while True:
+        await asyncio.sleep(ENTITY_CACHE_SAVE_INTERVAL)
+        save_entity_cache()
+
+
 async def main():
     """Запуск userbot"""
     logger.info("🤖 Userbot starting...")
-    logger.info(f"📱 Phone: {PHONE}")
-    logger.info(f"🆔 API ID: {API_ID}")
+    logger.info("📱 Phone: %s", PHONE)
+    logger.info("🆔 API ID: %s", API_ID)
+    
+    entity_cache.load()
     
     # Запускаем клиент
     await client.start(phone=PHONE)
     
+    # Прогрев идёт в фоне и не задерживает обработку сообщений
+    preload_task = asyncio.create_task(preload_pending_winners())
+    persist_task = asyncio.create_task(persist_entity_cache())
+    
     logger.info("✅ Userbot is running!")
     logger.info("Waiting for messages...")
     
     # Держим бота запущенным
-    await client.run_until_disconnected()
+    try:
+        await client.run_until_disconnected()
+    finally:
+        preload_task.cancel()
+        persist_task.cancel()
+        save_entity_cache()
 
 
 if __name__ == '__main__':
-    client.loop.run_until_complete(main())
\ No newline at end of file
+    try:
+        client.loop.run_until_complete(main())
+    except KeyboardInterrupt:
+        # При Ctrl+C finally в main() не выполняется: корутина остаётся
+        # приостановленной, поэтому сохраняем кэш здесь, пока жив логгер
+        save_entity_cache()
\ No newline at end of file
@@ -0,0 +1,152 @@
+"""
+Shared logging setup for bot, userbot and API
+Non-blocking (QueueHandler/QueueListener), JSON lines, sampling of high-volume events
+"""
+
+import os
+import sys
+import json
+import copy
+import queue
+import atexit
+import random
+import logging
+import logging.handlers
+from datetime import datetime, timezone
+
+# Доля сохраняемых записей для частых событий (event в extra=...).
+# Для записей без event ключом служит имя логгера (aiohttp.access -
+# по строке на каждый запрос к API). События не из списка (jackpot,
+# prize_claimed, ...) и записи WARNING и выше пишутся всегда.
+DEFAULT_SAMPLE_RATES = {
+    'dice_roll': 0.05,
+    'message_received': 0.1,
+    'gifts_listed': 0.1,
+    'aiohttp.access': 0.1,
+}
+
+# Стандартные атрибуты LogRecord - всё остальное пришло через extra=
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна JSON-строка на запись, поля из extra= попадают в корень"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Пропускает только долю rate записей для событий (или логгеров) из rates"""
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        event = getattr(record, 'event', None)
+        rate = self.rates.get(event if event is not None else record.name)
+        if rate is None:
+            return True
+        return random.random() < rate
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler, откладывающий сериализацию в поток QueueListener.
+
+    Стандартный prepare() вызывает format() прямо в event loop. Здесь в
+    вызывающем потоке подставляются только %-аргументы (пока объекты не
+    изменились), а JSON и traceback собираются уже в потоке QueueListener.
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+def parse_sample_rates(value):
+    """
+    Разобрать LOG_SAMPLE_RATES вида "dice_roll=0.01,message_received=1".
+
+    Возвращает (rates, errors): некорректные записи пропускаются и
+    попадают в errors, доли обрезаются до [0, 1].
+    """
+    rates = dict(DEFAULT_SAMPLE_RATES)
+    errors = []
+    for item in filter(None, (part.strip() for part in value.split(','))):
+        event, _, rate = item.partition('=')
+        try:
+            rates[event.strip()] = min(max(float(rate), 0.0), 1.0)
+        except ValueError:
+            errors.append(item)
+    return rates, errors
+
+
+def setup_logging(level=None, sample_rates=None):
+    """
+    Настроить корневой логгер один раз на процесс.
+
+    Уровень берётся из LOG_LEVEL (по умолчанию INFO), доли сэмплирования -
+    из LOG_SAMPLE_RATES. Формат: LOG_FORMAT=json (по умолчанию) или text.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    level = level or os.getenv('LOG_LEVEL', 'INFO').upper()
+    rate_errors = []
+    if sample_rates is None:
+        sample_rates, rate_errors = parse_sample_rates(os.getenv('LOG_SAMPLE_RATES', ''))
+
+    stream_handler = logging.StreamHandler(sys.stderr)
+    if os.getenv('LOG_FORMAT', 'json') == 'text':
+        stream_handler.setFormatter(logging.Formatter(
+            '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+        ))
+    else:
+        stream_handler.setFormatter(JsonFormatter())
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = LazyQueueHandler(log_queue)
+    # Фильтр на стороне очереди: отброшенные записи не попадают в поток
+    queue_handler.addFilter(SamplingFilter(sample_rates))
+
+    root = logging.getLogger()
+    root.handlers[:] = [queue_handler]
+    try:
+        root.setLevel(level)
+        bad_level = None
+    except (ValueError, TypeError):
+        root.setLevel(logging.INFO)
+        bad_level = level
+
+    # httpx логирует каждый getUpdates на INFO
+    logging.getLogger('httpx').setLevel(logging.WARNING)
+
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+    logger = logging.getLogger(__name__)
+    if bad_level is not None:
+        logger.warning("Unknown LOG_LEVEL %r, using INFO", bad_level)
+    for item in rate_errors:
+        logger.warning("Skipping bad LOG_SAMPLE_RATES entry %r", item)